@@ -1,21 +1,58 @@
+# Debe ir antes de cualquier otro import para que requests/pymongo cooperen con gevent
+from gevent import monkey
+monkey.patch_all()
+
 from flask import Flask, request, jsonify
+from flask.json.provider import JSONProvider
 from flasgger import Swagger
 from flask_cors import CORS
 from flask_pymongo import PyMongo
+from pymongo import ReturnDocument
 from bson import ObjectId
+from bson import json_util
 from datetime import datetime
 from datetime import timedelta
 import os
+import re
 from dotenv import load_dotenv
 import requests
+from requests.adapters import HTTPAdapter
+from concurrent.futures import ThreadPoolExecutor
 from flask_jwt_extended import JWTManager, jwt_required, get_jwt_identity
 from prometheus_client import Counter, Histogram, generate_latest
 import time
 from functools import wraps
+from threading import Lock
+from cachetools import TTLCache
+import orjson
+from indexes import DEFAULT_MONGO_URI, CART_USER_DONATION_INDEX, ensure_cart_indexes
 
 # Load environment variables
 load_dotenv()
 
+class OrjsonProvider(JSONProvider):
+    """Proveedor JSON de Flask basado en orjson (jsonify y request.get_json).
+    Los tipos que orjson no serializa (datetime, ObjectId...) se delegan a bson.json_util,
+    igual que el BSONProvider que instala Flask-PyMongo"""
+    option = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+    
+    @staticmethod
+    def default(o):
+        return json_util.default(o, json_options=json_util.RELAXED_JSON_OPTIONS)
+    
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, option=self.option, default=self.default).decode()
+    
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+    
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(
+            orjson.dumps(obj, option=self.option, default=self.default),
+            mimetype="application/json"
+        )
+
 app = Flask(__name__)
 swagger = Swagger(app)
 CORS(app)
@@ -25,16 +62,54 @@ REQUEST_COUNT = Counter('shopping_cart_http_requests_total', 'Total Requests', [
 REQUEST_LATENCY = Histogram('shopping_cart_http_request_duration_seconds', 'Request Latency', ['endpoint'])
 ERROR_COUNT = Counter('shopping_cart_http_request_errors_total', 'Total Errors', ['endpoint'])
 
+# Métricas hijas (.labels()) precalculadas por endpoint, ver _init_metric_children()
+_MONITORED_ENDPOINTS = set()
+_req_counter = {}
+_req_latency = {}
+_req_errors = {}
+
+def _request_counter(method, endpoint):
+    counter = _req_counter.get((method, endpoint))
+    if counter is None:
+        counter = _req_counter[(method, endpoint)] = REQUEST_COUNT.labels(method=method, endpoint=endpoint)
+    return counter
+
+def _request_latency(endpoint):
+    histogram = _req_latency.get(endpoint)
+    if histogram is None:
+        histogram = _req_latency[endpoint] = REQUEST_LATENCY.labels(endpoint=endpoint)
+    return histogram
+
+def _request_errors(endpoint):
+    counter = _req_errors.get(endpoint)
+    if counter is None:
+        counter = _req_errors[endpoint] = ERROR_COUNT.labels(endpoint=endpoint)
+    return counter
+
+def _init_metric_children():
+    """Precalcula las métricas hijas de los endpoints monitoreados (llamar tras registrar las rutas)"""
+    for rule in app.url_map.iter_rules():
+        if rule.endpoint not in _MONITORED_ENDPOINTS:
+            continue
+        for method in rule.methods - {"HEAD", "OPTIONS"}:
+            _request_counter(method, rule.endpoint)
+        _request_latency(rule.endpoint)
+        _request_errors(rule.endpoint)
+
 def monitor_metrics(f):
     """Decorador para monitorear métricas de Prometheus"""
+    _MONITORED_ENDPOINTS.add(f.__name__)
+    # Referencias en el closure: evita buscar estos nombres en los globales en cada request
+    count, latency, errors, now = _request_counter, _request_latency, _request_errors, time.time
+    
     @wraps(f)
     def decorated_function(*args, **kwargs):
-        start_time = time.time()
+        start_time = now()
         endpoint = request.endpoint or 'unknown'
         method = request.method
         
         # Incrementar contador de requests
-        REQUEST_COUNT.labels(method=method, endpoint=endpoint).inc()
+        count(method, endpoint).inc()
         
         try:
             # Ejecutar la función
@@ -42,26 +117,228 @@ def monitor_metrics(f):
             return response
         except Exception as e:
             # Incrementar contador de errores
-            ERROR_COUNT.labels(endpoint=endpoint).inc()
+            errors(endpoint).inc()
             raise
         finally:
             # Medir latencia
-            duration = time.time() - start_time
-            REQUEST_LATENCY.labels(endpoint=endpoint).observe(duration)
+            duration = now() - start_time
+            latency(endpoint).observe(duration)
     
     return decorated_function
 
 # Configure MongoDB
-app.config["MONGO_URI"] = os.getenv("MONGO_URI", "mongodb://localhost:27017/shopping_cart_db")
-mongo = PyMongo(app)
+app.config["MONGO_URI"] = os.getenv("MONGO_URI", DEFAULT_MONGO_URI)
+app.config["CART_INDEX_READY"] = False  # se confirma una vez por proceso, ver _check_cart_index()
+# connect=False: no abrir conexiones al importar (gunicorn importa la app antes del fork)
+mongo = PyMongo(app, connect=False)
+# Debe ir después de PyMongo(app), que instala su propio BSONProvider en app.json
+app.json = OrjsonProvider(app)
+
+# Si la colección "donations" está disponible (o replicada) en esta misma base de datos,
+# get_cart la une con $lookup en lugar de consultar el servicio de donaciones por HTTP
+app.config["DONATIONS_LOOKUP"] = os.getenv("DONATIONS_LOOKUP", "false").lower() == "true"
 
 # Configure JWT
 app.config["JWT_SECRET_KEY"] = os.getenv("JWT_SECRET_KEY", "lkhjap8gy2p 03kt")
 jwt = JWTManager(app)
 app.config["JWT_ACCESS_TOKEN_EXPIRES"] = timedelta(hours=1)  # o más
 
-# Create indexes
-mongo.db.cart.create_index([("user_email", 1), ("donation_id", 1)], unique=True)
+# Configure external services
+DONATIONS_URL = os.getenv("DONATIONS_URL", "http://localhost:5000/api/donations")
+NOTIFICATIONS_URL = os.getenv("NOTIFICATIONS_URL", "http://localhost:5001/sendNotification")
+
+# Configure HTTP client (shared connection pool for outbound calls)
+SESSION = requests.Session()
+SESSION.mount("http://", HTTPAdapter(pool_connections=16, pool_maxsize=64, max_retries=0))
+HTTP_TIMEOUT = (1.0, 3.0)  # (connect, read) en segundos
+
+class DonationsUnavailable(requests.exceptions.RequestException):
+    """El servicio de donaciones no está disponible (circuito abierto o respuesta 5xx)"""
+
+class CircuitBreaker:
+    """Circuit breaker simple: tras `failure_threshold` fallos seguidos rechaza las llamadas
+    durante `cooldown` segundos, luego deja pasar una llamada de prueba"""
+    
+    def __init__(self, failure_threshold=5, cooldown=30):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+        self.trial_in_flight = False  # estado half-open: ya hay una llamada de prueba en curso
+        self.lock = Lock()
+    
+    def before_call(self):
+        with self.lock:
+            if self.opened_at is None:
+                return
+            if self.trial_in_flight or time.monotonic() - self.opened_at < self.cooldown:
+                raise DonationsUnavailable("Donation service circuit is open")
+            # Half-open: esta llamada es la de prueba, el resto sigue rechazándose
+            self.trial_in_flight = True
+    
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial_in_flight = False
+    
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            self.trial_in_flight = False
+            if self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+
+DONATIONS_BREAKER = CircuitBreaker()
+
+def _donations_request(method, path, **kwargs):
+    """Llamada al servicio de donaciones con timeout y circuit breaker.
+    Las respuestas 5xx se reportan como DonationsUnavailable, igual que un timeout."""
+    DONATIONS_BREAKER.before_call()
+    try:
+        response = SESSION.request(method, f"{DONATIONS_URL}{path}", timeout=HTTP_TIMEOUT, **kwargs)
+    except BaseException:
+        # BaseException: gevent.Timeout/GreenletExit no heredan de Exception y, si matan la
+        # llamada de prueba, el breaker quedaría en half-open para siempre
+        DONATIONS_BREAKER.record_failure()
+        raise
+    
+    if response.status_code >= 500:
+        DONATIONS_BREAKER.record_failure()
+        raise DonationsUnavailable(f"Donation service error: status code {response.status_code}")
+    
+    DONATIONS_BREAKER.record_success()
+    return response
+
+# Cache de donaciones consultadas (evita repetir la llamada HTTP dentro del TTL)
+_donation_cache = TTLCache(maxsize=10_000, ttl=30)
+_donation_cache_lock = Lock()
+
+def get_donation(donation_id):
+    """Obtiene una donación del servicio de donaciones, usando la caché si es posible.
+    Retorna None si la donación no existe o el servicio responde con error."""
+    with _donation_cache_lock:
+        donation_data = _donation_cache.get(donation_id)
+    if donation_data is not None:
+        return donation_data
+    
+    donation_response = _donations_request("GET", f"/{donation_id}")
+    if donation_response.status_code != 200:
+        return None
+    
+    donation_data = donation_response.json()
+    with _donation_cache_lock:
+        _donation_cache[donation_id] = donation_data
+    return donation_data
+
+def get_donations(donation_ids):
+    """Obtiene varias donaciones a la vez como un dict {id: donación}.
+    Las que no están en caché se piden en una sola llamada al endpoint bulk.
+    Si el endpoint bulk no responde 200 lanza DonationsUnavailable (no se oculta el carrito)."""
+    donations = {}
+    missing_ids = []
+    with _donation_cache_lock:
+        for donation_id in donation_ids:
+            donation_data = _donation_cache.get(donation_id)
+            if donation_data is not None:
+                donations[donation_id] = donation_data
+            else:
+                missing_ids.append(donation_id)
+    
+    if missing_ids:
+        donations_response = _donations_request("POST", "/bulk", json={"ids": missing_ids})
+        if donations_response.status_code != 200:
+            raise DonationsUnavailable(
+                f"Donation bulk lookup failed: status code {donations_response.status_code}"
+            )
+        fetched = donations_response.json()
+        with _donation_cache_lock:
+            _donation_cache.update(fetched)
+        donations.update(fetched)
+    return donations
+
+# Consultas bulk de get_cart: los lotes completos se envían mientras se recorre el cursor
+# (como máximo DONATIONS_MAX_INFLIGHT en paralelo por request); el último lote va en línea
+DONATIONS_BATCH_SIZE = 100
+DONATIONS_MAX_INFLIGHT = 4
+
+DONATION_DETAIL_FIELDS = ("title", "description", "category", "condition", "image_url", "city")
+
+def _serialize_cart_item(item, donation_data):
+    """Construye la respuesta de un item del carrito con los detalles de su donación"""
+    return {
+        "_id": str(item["_id"]),
+        "user_email": item["user_email"],
+        "donation_id": item["donation_id"],
+        "notes": item.get("notes", ""),
+        "created_at": item["created_at"].isoformat(),
+        "status": item["status"],
+        "donation_details": {field: donation_data.get(field) for field in DONATION_DETAIL_FIELDS}
+    }
+
+# Notificaciones al donante en segundo plano (no bloquean la respuesta)
+NOTIF_EXECUTOR = ThreadPoolExecutor(max_workers=4)
+
+def _send_notification(notification_data, auth_header):
+    """Envía la notificación al donante; los fallos solo se registran"""
+    try:
+        notification_response = SESSION.post(
+            NOTIFICATIONS_URL,
+            json=notification_data,
+            headers={"Authorization": auth_header},
+            timeout=HTTP_TIMEOUT
+        )
+        
+        if notification_response.status_code != 200:
+            # No fallar la operación principal si solo falla la notificación
+            print(f"Notification failed: {notification_response.text}")
+            
+    except Exception as e:
+        print(f"Notification error: {str(e)}")
+
+@app.before_request
+def _check_cart_index():
+    """Una vez por proceso (worker): confirma, o crea si falta, el índice único del carrito.
+    Con gunicorn ya lo creó el hook on_starting, así que aquí solo se lee index_information()."""
+    # Solo los endpoints del carrito; /metrics y /apidocs no dependen de MongoDB
+    if not app.config["CART_INDEX_READY"] and request.endpoint in _MONITORED_ENDPOINTS:
+        ensure_cart_indexes(mongo.db)
+        app.config["CART_INDEX_READY"] = True
+
+# ObjectId válido: 24 caracteres hexadecimales
+_OID_RE = re.compile(r"[a-fA-F0-9]{24}")
+
+# Proyecciones: solo se decodifican los campos que usa cada handler
+CART_ITEM_PROJECTION = {"_id": 1, "user_email": 1, "donation_id": 1, "notes": 1, "created_at": 1, "status": 1}
+CLAIM_ITEM_PROJECTION = {"user_email": 1, "donation_id": 1, "status": 1, "claiming_at": 1}
+
+# Una reserva "claiming" más antigua que esto se considera abandonada y puede reservarse de nuevo
+CLAIM_STALE_AFTER = timedelta(minutes=2)
+CLAIM_FINALIZE_ATTEMPTS = 3
+
+def _release_cart_claim(obj_id, claiming_at):
+    """Devuelve a pending un item reservado por claim_item cuando falla el claim de la donación"""
+    mongo.db.cart.update_one(
+        {"_id": obj_id, "status": "claiming", "claiming_at": claiming_at},
+        {"$set": {"status": "pending"}, "$unset": {"claiming_at": ""}}
+    )
+
+def _finalize_cart_claim(obj_id, claiming_at):
+    """Pasa el item reservado de claiming a claimed, reintentando si falla la base de datos.
+    Si se agotan los intentos relanza el error; la reserva quedará vencida tras CLAIM_STALE_AFTER."""
+    for attempt in range(CLAIM_FINALIZE_ATTEMPTS):
+        try:
+            return mongo.db.cart.update_one(
+                {"_id": obj_id, "status": "claiming", "claiming_at": claiming_at},
+                {"$set": {
+                    "status": "claimed",
+                    "claimed_at": datetime.utcnow()
+                }, "$unset": {"claiming_at": ""}}
+            )
+        except Exception:
+            if attempt == CLAIM_FINALIZE_ATTEMPTS - 1:
+                raise
+            time.sleep(0.1 * (attempt + 1))
 
 @app.route('/cart', methods=['POST'])
 @monitor_metrics
@@ -104,8 +381,15 @@ def add_to_cart():
         return jsonify({"error": "Missing required fields"}), 400
     
     # Verify the donation exists and is available
-    donation_response = requests.get(f"http://localhost:5000/api/donations/{data['donation_id']}")
-    if donation_response.status_code != 200 or not donation_response.json().get('available', False):
+    try:
+        donation_data = get_donation(data['donation_id'])
+    except requests.exceptions.RequestException as e:
+        return jsonify({
+            "error": "Donation service unavailable",
+            "details": str(e)
+        }), 503
+    
+    if donation_data is None or not donation_data.get('available', False):
         return jsonify({"error": "Donation not available"}), 404
     
     cart_item = {
@@ -113,7 +397,7 @@ def add_to_cart():
         "donation_id": data["donation_id"],
         "notes": data.get("notes", ""),
         "created_at": datetime.utcnow(),
-        "status": "pending"  # pending, claimed, cancelled
+        "status": "pending"  # pending, claiming, claimed, cancelled
     }
     
     try:
@@ -158,31 +442,71 @@ def get_cart():
                 type: object
     """
     current_user = get_jwt_identity()
-    user_cart = list(mongo.db.cart.find({"user_email": current_user}))
     
-    # Enhance with donation details
+    if app.config["DONATIONS_LOOKUP"]:
+        # Join with the donations collection in a single aggregation (no HTTP calls)
+        pipeline = [
+            {"$match": {"user_email": current_user}},
+            {"$addFields": {"donation_oid": {"$convert": {
+                "input": "$donation_id", "to": "objectId", "onError": None, "onNull": None
+            }}}},
+            {"$lookup": {
+                "from": "donations",
+                "localField": "donation_oid",
+                "foreignField": "_id",
+                "as": "donation_details"
+            }},
+            {"$unwind": "$donation_details"},
+            {"$project": {
+                "user_email": 1,
+                "donation_id": 1,
+                "notes": 1,
+                "created_at": 1,
+                "status": 1,
+                **{f"donation_details.{field}": 1 for field in DONATION_DETAIL_FIELDS}
+            }}
+        ]
+        enhanced_cart = [
+            _serialize_cart_item(item, item["donation_details"])
+            for item in mongo.db.cart.aggregate(pipeline, hint=CART_USER_DONATION_INDEX)
+        ]
+        return jsonify(enhanced_cart), 200
+    
+    # Stream the cursor and request donation details in batches as items arrive,
+    # so the Mongo read overlaps with the bulk donation requests
+    cursor = mongo.db.cart.find({"user_email": current_user}, CART_ITEM_PROJECTION).hint(CART_USER_DONATION_INDEX)
+    user_cart = []
+    pending = []
+    batch = []
+    executor = None
+    try:
+        for item in cursor:
+            user_cart.append(item)
+            batch.append(item['donation_id'])
+            if len(batch) == DONATIONS_BATCH_SIZE:
+                # Only carts larger than one batch pay for a (per-request) pool
+                if executor is None:
+                    executor = ThreadPoolExecutor(max_workers=DONATIONS_MAX_INFLIGHT)
+                pending.append(executor.submit(get_donations, batch))
+                batch = []
+        
+        donations = get_donations(batch) if batch else {}
+        for future in pending:
+            donations.update(future.result())
+    except requests.exceptions.RequestException as e:
+        return jsonify({
+            "error": "Donation service unavailable",
+            "details": str(e)
+        }), 503
+    finally:
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+    
     enhanced_cart = []
     for item in user_cart:
-        donation_response = requests.get(f"http://localhost:5000/api/donations/{item['donation_id']}")
-        if donation_response.status_code == 200:
-            donation_data = donation_response.json()
-            enhanced_item = {
-                "_id": str(item["_id"]),
-                "user_email": item["user_email"],
-                "donation_id": item["donation_id"],
-                "notes": item.get("notes", ""),
-                "created_at": item["created_at"].isoformat(),
-                "status": item["status"],
-                "donation_details": {
-                    "title": donation_data.get("title"),
-                    "description": donation_data.get("description"),
-                    "category": donation_data.get("category"),
-                    "condition": donation_data.get("condition"),
-                    "image_url": donation_data.get("image_url"),
-                    "city": donation_data.get("city")
-                }
-            }
-            enhanced_cart.append(enhanced_item)
+        donation_data = donations.get(item['donation_id'])
+        if donation_data is not None:
+            enhanced_cart.append(_serialize_cart_item(item, donation_data))
     
     return jsonify(enhanced_cart), 200
 
@@ -212,12 +536,11 @@ def remove_from_cart(cart_item_id):
     """
     current_user = get_jwt_identity()
     
-    try:
-        obj_id = ObjectId(cart_item_id)
-    except:
+    if not _OID_RE.fullmatch(cart_item_id):
         return jsonify({"error": "Invalid cart item ID"}), 400
+    obj_id = ObjectId(cart_item_id)
     
-    item = mongo.db.cart.find_one({"_id": obj_id})
+    item = mongo.db.cart.find_one({"_id": obj_id}, {"user_email": 1})
     if not item:
         return jsonify({"error": "Item not found in cart"}), 404
     
@@ -266,96 +589,101 @@ def claim_item(cart_item_id):
         description: Item not found in cart
       403:
         description: Not authorized to claim this item
+      409:
+        description: Another claim of this item is in progress
     """
     current_user = get_jwt_identity()
     
-    try:
-        obj_id = ObjectId(cart_item_id)
-    except:
+    if not _OID_RE.fullmatch(cart_item_id):
         return jsonify({"error": "Invalid cart item ID"}), 400
+    obj_id = ObjectId(cart_item_id)
     
-    # Find the cart item and verify ownership
-    item = mongo.db.cart.find_one({"_id": obj_id})
-    if not item:
-        return jsonify({"error": "Item not found in cart"}), 404
-    
-    if item["user_email"] != current_user:
-        return jsonify({"error": "Not authorized to claim this item"}), 403
+    # Reserve the cart item first (atomic: only if pending, or an abandoned reservation,
+    # and owned by the user)
+    now = datetime.utcnow()
+    item = mongo.db.cart.find_one_and_update(
+        {"_id": obj_id, "user_email": current_user, "$or": [
+            {"status": "pending"},
+            {"status": "claiming", "claiming_at": {"$lt": now - CLAIM_STALE_AFTER}},
+            {"status": "claiming", "claiming_at": {"$exists": False}}
+        ]},
+        {"$set": {"status": "claiming", "claiming_at": now}},
+        projection=CLAIM_ITEM_PROJECTION,
+        return_document=ReturnDocument.AFTER
+    )
     
-    # If already claimed, return success
-    if item['status'] == 'claimed':
-        return jsonify({
-            "message": "Item already claimed",
-            "item_id": cart_item_id,
-            "status": "claimed",
-            "donation_id": str(item["donation_id"])
-        }), 200
-    
-    if item['status'] != 'pending':
+    if item is None:
+        # Nothing was reserved: read once to report why
+        item = mongo.db.cart.find_one({"_id": obj_id}, CLAIM_ITEM_PROJECTION)
+        if not item:
+            return jsonify({"error": "Item not found in cart"}), 404
+        
+        if item["user_email"] != current_user:
+            return jsonify({"error": "Not authorized to claim this item"}), 403
+        
+        # If already claimed, return success
+        if item['status'] == 'claimed':
+            return jsonify({
+                "message": "Item already claimed",
+                "item_id": cart_item_id,
+                "status": "claimed",
+                "donation_id": str(item["donation_id"])
+            }), 200
+        
+        if item['status'] == 'claiming':
+            return jsonify({
+                "error": "Item claim already in progress",
+                "item_id": cart_item_id
+            }), 409
+        
         return jsonify({
             "error": "Item already processed",
             "current_status": item['status']
         }), 400
     
-    # Verify donation is still available
+    # Claim the donation (the donations service checks and flips availability atomically).
+    # If it fails, the cart item goes back to pending.
+    claiming_at = item["claiming_at"]
     try:
-        donation_response = requests.get(
-            f"http://localhost:5000/api/donations/{item['donation_id']}",
-            timeout=5
+        auth_header = request.headers.get('Authorization')
+        claim_response = _donations_request(
+            "POST",
+            f"/{item['donation_id']}/claim",
+            headers={"Authorization": auth_header}
         )
         
-        if donation_response.status_code != 200:
-            return jsonify({
-                "error": "Donation verification failed",
-                "details": f"Status code: {donation_response.status_code}"
-            }), 400
-            
-        donation_data = donation_response.json()
-        
-        if not donation_data.get('available', False):
+        if claim_response.status_code == 409:
+            # El valor en caché ("available": True) ya no es válido
+            with _donation_cache_lock:
+                _donation_cache.pop(item['donation_id'], None)
+            _release_cart_claim(obj_id, claiming_at)
             return jsonify({
                 "error": "Donation no longer available",
                 "donation_id": str(item["donation_id"])
             }), 400
-            
-    except requests.exceptions.RequestException as e:
-        return jsonify({
-            "error": "Donation service unavailable",
-            "details": str(e)
-        }), 503
-    
-    # Update donation availability
-    try:
-        auth_header = request.headers.get('Authorization')  # asegúrate de obtenerlo antes si no está
-        update_response = requests.patch(
-        f"http://localhost:5000/api/donations/{item['donation_id']}/availability",
-        json={"available": False},
-        headers={"Authorization": auth_header},  # añade el JWT aquí
-        timeout=5
-        )
-
         
-        if update_response.status_code != 200:
+        if claim_response.status_code != 200:
+            _release_cart_claim(obj_id, claiming_at)
             return jsonify({
                 "error": "Could not update donation status",
-                "details": update_response.json()
+                "details": f"Status code: {claim_response.status_code}"
             }), 400
+        
+        donation_data = claim_response.json()
+        
+        with _donation_cache_lock:
+            _donation_cache.pop(item['donation_id'], None)
             
     except requests.exceptions.RequestException as e:
+        _release_cart_claim(obj_id, claiming_at)
         return jsonify({
-            "error": "Failed to update donation availability",
+            "error": "Donation service unavailable",
             "details": str(e)
         }), 503
     
-    # Update cart item status
+    # Finalize the cart item status (the donation is already claimed, so retry on errors)
     try:
-        update_result = mongo.db.cart.update_one(
-            {"_id": obj_id},
-            {"$set": {
-                "status": "claimed",
-                "claimed_at": datetime.utcnow()
-            }}
-        )
+        update_result = _finalize_cart_claim(obj_id, claiming_at)
         
         if update_result.modified_count != 1:
             return jsonify({
@@ -380,16 +708,7 @@ def claim_item(cart_item_id):
         }
 
         auth_header = request.headers.get('Authorization')
-        notification_response = requests.post(
-            "http://localhost:5001/sendNotification",
-            json=notification_data,
-            headers={"Authorization": auth_header},
-            timeout=10
-        )
-        
-        if notification_response.status_code != 200:
-            # No fallar la operación principal si solo falla la notificación
-            print(f"Notification failed: {notification_response.text}")
+        NOTIF_EXECUTOR.submit(_send_notification, notification_data, auth_header)
             
     except Exception as e:
         print(f"Notification error: {str(e)}")
@@ -461,5 +780,7 @@ def metrics():
     """
     return generate_latest(), 200, {'Content-Type': 'text/plain; charset=utf-8'}
 
+_init_metric_children()
+
 if __name__ == '__main__':
     app.run(debug=True, port=5003)
\ No newline at end of file
@@ -0,0 +1,15 @@
+"""Configuración de gunicorn (se carga automáticamente al ejecutar `gunicorn` en esta carpeta)"""
+
+wsgi_app = "app:app"
+bind = "0.0.0.0:5003"
+worker_class = "gevent"
+workers = 4
+worker_connections = 500
+
+def on_starting(server):
+    # Se ejecuta una sola vez en el proceso maestro, antes de crear los workers.
+    # Solo usa indexes.py: importar app.py aquí aplicaría el monkey-patch de gevent al maestro.
+    from dotenv import load_dotenv
+    from indexes import ensure_indexes
+    load_dotenv()
+    ensure_indexes()
@@ -0,0 +1,21 @@
+"""Índices de MongoDB del carrito.
+
+No importa app.py, para poder usarse desde los hooks de gunicorn sin cargar la aplicación
+(ni aplicar el monkey-patch de gevent) en el proceso maestro."""
+import os
+from pymongo import MongoClient
+
+DEFAULT_MONGO_URI = "mongodb://localhost:27017/shopping_cart_db"
+
+CART_USER_DONATION_INDEX = [("user_email", 1), ("donation_id", 1)]
+CART_USER_DONATION_INDEX_NAME = "user_email_1_donation_id_1"
+
+def ensure_cart_indexes(db):
+    """Crea el índice único (user_email, donation_id) del carrito si todavía no existe"""
+    if CART_USER_DONATION_INDEX_NAME not in db.cart.index_information():
+        db.cart.create_index(CART_USER_DONATION_INDEX, unique=True, name=CART_USER_DONATION_INDEX_NAME)
+
+def ensure_indexes(mongo_uri=None):
+    """Crea los índices usando un cliente propio de corta duración (por ejemplo desde gunicorn)"""
+    with MongoClient(mongo_uri or os.getenv("MONGO_URI", DEFAULT_MONGO_URI)) as client:
+        ensure_cart_indexes(client.get_default_database())